@@ -16,33 +16,55 @@ Key refinements in this release
 """
 from __future__ import annotations
 
-import asyncio, html, logging, pathlib, re
-from typing import Any, Dict, Iterable, List, Optional
+import asyncio, html, io, json, logging, pathlib, weakref
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 
 import aiohttp, feedparser, yaml
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+try:  # libyaml C loader/dumper, when PyYAML was built against it
+    from yaml import CSafeDumper as _YamlDumper, CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper, SafeLoader as _YamlLoader
+try:  # linear-time automaton matching; patterns below stay re-compatible
+    import re2 as re
+except ImportError:
+    import re
 
 # ---------------------------------------------------------------------------
 # Logging
 # ---------------------------------------------------------------------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+# Library module: handlers/levels are configured by the entry-point scripts
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
 TIMEOUT = 15  # seconds
+PER_HOST_LIMIT = 4           # concurrent requests per origin
+RETRY_STATUS   = {429, 500, 502, 503, 504}
+MAX_RETRIES    = 3
+BACKOFF        = 0.5         # seconds, doubled per attempt
+MAX_BACKOFF    = 30          # cap for Retry-After / backoff waits
 HEADERS = {
     "User-Agent": "NewsScraper/0.3 (+https://github.com/DaniLim)",
     # Prefer XML/RSS but fall back gracefully
     "Accept": "application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8",
 }
 FEEDS_YAML = pathlib.Path(__file__).resolve().parents[1] / "feeds.yaml"
+HTTP_CACHE_JSON = FEEDS_YAML.with_name(".feed_cache.json")
+
+# {url: (ETag, Last-Modified)} from the last successful fetch
+Validators = Dict[str, Tuple[Optional[str], Optional[str]]]
 
 # MIME & URL heuristics
-FEED_MIME_RE = re.compile(r"(?:application|text)/(?:rss|atom)\+xml(?:;.*)?", re.I)
-URL_FEED_RE  = re.compile(r"rss|feeds?|\.xml|\.rss|\.atom", re.I)
+# (inline (?i) rather than re.I: google-re2 has no flag constants)
+_URL_FEED    = r"rss|feeds?|\.xml|\.rss|\.atom"
+FEED_MIME_RE = re.compile(r"(?i)(?:application|text)/(?:rss|atom)\+xml(?:;.*)?")
+# href/src values that look like feeds – attribute scan and filter in one pass
+FEED_ATTR_RE = re.compile(rf"""(?i)(?:href|src)\s*=\s*["']([^"']*(?:{_URL_FEED})[^"']*)["']""")
 
 # Common path probes
 GENERIC_PROBES = [
@@ -60,55 +82,199 @@ COMMON_FEED_PATHS = GENERIC_PROBES + SPECIFIC_PROBES
 # ---------------------------------------------------------------------------
 # HTTP helpers
 # ---------------------------------------------------------------------------
-async def _fetch_raw(session: aiohttp.ClientSession, url: str) -> bytes:
-    """Return body **bytes**; raises on error."""
-    async with session.get(url, headers=HEADERS, timeout=TIMEOUT) as resp:
-        resp.raise_for_status()
-        return await resp.read()
+def run_loop(main: Awaitable[Any]) -> Any:
+    """``asyncio.run`` on uvloop when it is installed (no Windows build)."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(main)
+    return uvloop.run(main)
+
+def make_session(concurrency: int) -> aiohttp.ClientSession:
+    """
+    Session shared by every request of a run.
+
+    Keep‑alive pooling and the DNS cache let the many probes that discovery
+    sends to one host reuse a single connection instead of a fresh TLS
+    handshake each time.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=concurrency * 4,
+        limit_per_host=PER_HOST_LIMIT,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True,
+        keepalive_timeout=30,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=HEADERS,
+        timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+    )
+
+def _retry_delay(resp: aiohttp.ClientResponse, attempt: int) -> float:
+    """Seconds to wait before retrying: *Retry-After* if sent, else backoff."""
+    after = resp.headers.get("Retry-After", "")
+    if after.isdigit():
+        delay = float(after)
+    else:
+        try:
+            delay = (parsedate_to_datetime(after) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            delay = BACKOFF * 2 ** attempt
+    return min(max(delay, 0.0), MAX_BACKOFF)
+
+async def _get(session: aiohttp.ClientSession, url: str, read, headers=None):
+    """GET *url* and return ``await read(resp)``; 429/5xx are retried."""
+    for attempt in range(MAX_RETRIES + 1):
+        async with session.get(url, headers=headers) as resp:
+            if resp.status not in RETRY_STATUS or attempt == MAX_RETRIES:
+                resp.raise_for_status()
+                return await read(resp)
+            delay = _retry_delay(resp, attempt)
+        await asyncio.sleep(delay)
+
+class _Shared:
+    """A memoised lookup and the number of callers currently awaiting it."""
+    __slots__ = ("fut", "waiters")
+
+    def __init__(self, fut: asyncio.Future) -> None:
+        self.fut, self.waiters = fut, 0
+
+# Lookups already started with a session; it lives as long as the session,
+# i.e. one check/fix/ingest run
+_memo: "weakref.WeakKeyDictionary[aiohttp.ClientSession, Dict[tuple, _Shared]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+async def _memoized(session: aiohttp.ClientSession, key: tuple,
+                    factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Await ``factory()`` once per *session* and *key*; repeat callers share it.
+
+    A failed lookup is cached as *None*: a stored exception's traceback would
+    reference the session and keep its weak key alive forever.
+    """
+    cache = _memo.setdefault(session, {})
+    entry = cache.get(key)
+    if entry is None:
+        entry = cache[key] = _Shared(asyncio.ensure_future(_or_none(factory)))
+    entry.waiters += 1
+    try:
+        # shield: a caller cancelled by _race_first mustn't cancel a lookup
+        # others still await…
+        return await asyncio.shield(entry.fut)
+    finally:
+        entry.waiters -= 1
+        # …but once the last one is gone, stop the download and forget it
+        if not entry.waiters and not entry.fut.done():
+            entry.fut.cancel()
+            if cache.get(key) is entry:
+                del cache[key]
+
+async def _or_none(factory: Callable[[], Awaitable[Any]]) -> Any:
+    try:
+        return await factory()
+    except Exception:
+        return None
+
+def _remember(session: aiohttp.ClientSession, key: tuple, value: Any) -> None:
+    """Seed the :func:`_memoized` cache with a result obtained another way."""
+    fut = asyncio.get_running_loop().create_future()
+    fut.set_result(value)
+    _memo.setdefault(session, {}).setdefault(key, _Shared(fut))
+
+async def fetch_raw(session: aiohttp.ClientSession, url: str,
+                     validators: Optional[Validators] = None) -> Optional[bytes]:
+    """
+    Return body **bytes**; raises on error.
+
+    With *validators* the GET is conditional: *None* means 304 Not Modified,
+    and the ETag/Last-Modified of a fresh body are recorded for next time.
+    """
+    headers = {}
+    if validators and url in validators:
+        etag, modified = validators[url]
+        if etag:
+            headers["If-None-Match"] = etag
+        if modified:
+            headers["If-Modified-Since"] = modified
+
+    async def read(resp: aiohttp.ClientResponse) -> Optional[bytes]:
+        if resp.status == 304:
+            return None
+        body = await resp.read()
+        # only once the body is in: a failed read must not leave validators
+        # that would answer 304 for content nobody has seen
+        if validators is not None:
+            fresh = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            if any(fresh):
+                validators[url] = fresh
+            else:
+                validators.pop(url, None)
+        return body
+
+    return await _get(session, url, read, headers)
 
 async def _fetch_text(session: aiohttp.ClientSession, url: str) -> str:
     """Return body decoded as text using aiohttp auto‑detection."""
-    async with session.get(url, headers=HEADERS, timeout=TIMEOUT) as resp:
-        resp.raise_for_status()
-        return await resp.text()
+    return await _get(session, url, aiohttp.ClientResponse.text)
 
 # ---------------------------------------------------------------------------
 # Validation
 # ---------------------------------------------------------------------------
-async def validate_url(url: str, session: aiohttp.ClientSession, *, strict: bool = True) -> bool:
+async def validate_url(url: str, session: aiohttp.ClientSession, *, strict: bool = True,
+                       validators: Optional[Validators] = None) -> bool:
     """
     True if *url* is a well‑formed feed.
 
     • Uses raw bytes to let feedparser honour the XML prolog’s charset.
     • Accepts feeds with non‑fatal *bozo* issues so long as entries exist
       (or *strict* is False).
+    • Memoised per session, so repeated checks of one URL fetch it once.
+    • With *validators* (see :func:`load_http_cache`) a feed that answers
+      304 is reported valid unparsed; only valid feeds keep validators.
     """
+    return await _memoized(session, ("validate", url, strict),
+                           lambda: _validate(url, session, strict=strict,
+                                             validators=validators))
+
+async def _validate(url: str, session: aiohttp.ClientSession, *, strict: bool,
+                    validators: Optional[Validators]) -> bool:
     try:
-        raw = await _fetch_raw(session, url)
+        raw = await fetch_raw(session, url, validators)
     except Exception:
+        if validators is not None:
+            validators.pop(url, None)
         return False
+    if raw is None:  # 304: unchanged since it last validated
+        return True
+    if _validate_bytes(raw, strict=strict):
+        return True
+    if validators is not None:
+        validators.pop(url, None)
+    return False
 
-    parsed = feedparser.parse(raw)
-    if parsed.bozo and not parsed.entries:
-        return False
-    if strict and not parsed.entries:
-        return False
-    return True
+def _validate_bytes(raw: bytes, *, strict: bool) -> bool:
+    """The parsing half of :func:`validate_url`, for an already fetched body."""
+    # A stream skips feedparser's URL/filename sniffing of the raw body
+    parsed = feedparser.parse(io.BytesIO(raw))
+    return bool(parsed.entries) or not (parsed.bozo or strict)
 
 # ---------------------------------------------------------------------------
 # Discovery helpers
 # ---------------------------------------------------------------------------
 async def _extract_feed_urls(html_text: str, base_url: str) -> List[str]:
-    soup = BeautifulSoup(html_text, "html.parser")
-    candidates: List[str] = []
-    for tag in soup.find_all(True):
-        for val in (tag.attrs.get("href"), tag.attrs.get("src")):
-            if isinstance(val, str) and URL_FEED_RE.search(val):
-                candidates.append(urljoin(base_url, val))
-    # Deduplicate
-    seen: set[str] = set()
-    uniq = [c for c in candidates if not (c in seen or seen.add(c))]
-    return uniq
+    # <link rel="alternate" type="application/rss+xml"> is authoritative, so
+    # list it first; only <link> tags are built into the tree.
+    soup = BeautifulSoup(html_text, "lxml", parse_only=SoupStrainer("link"))
+    alternates = [
+        tag["href"] for tag in soup.find_all("link", href=True)
+        if "alternate" in (tag.get("rel") or []) and FEED_MIME_RE.match(tag.get("type", ""))
+    ]
+    # Everything else: one regex pass over the raw markup, no tree walk; the
+    # values are still entity-encoded (&amp;), which the soup decoded for us
+    links = [html.unescape(v) for v in FEED_ATTR_RE.findall(html_text)]
+    return list(dict.fromkeys(urljoin(base_url, v) for v in alternates + links))
 
 async def _probe_candidate(session: aiohttp.ClientSession, url: str) -> Optional[str]:
     return url if await validate_url(url, session, strict=False) else None
@@ -118,43 +284,79 @@ async def _alt_hosts(url: str) -> List[str]:
     naked = p.netloc.lstrip("www.")
     return list(dict.fromkeys([f"{p.scheme}://{naked}", f"{p.scheme}://www.{naked}"]))
 
+async def _probe_path(session: aiohttp.ClientSession, probe: str) -> Optional[str]:
+    """Feed served at *probe* itself, or linked from the page found there."""
+    # One download serves both the feed check and the link scan
+    try:
+        raw = await fetch_raw(session, probe)
+    except Exception:
+        return None
+    if _validate_bytes(raw, strict=False):
+        logger.debug("Feed via path %s", probe)
+        _remember(session, ("validate", probe, False), True)
+        return probe
+    for cand in await _extract_feed_urls(raw.decode("utf-8", "replace"), probe):
+        if await _probe_candidate(session, cand):
+            logger.debug("Feed inside %s → %s", probe, cand)
+            return cand
+    return None
+
+async def _race_first(coros: Iterable[Awaitable[Optional[str]]]) -> Optional[str]:
+    """Run *coros* concurrently; return the first truthy result, cancel the rest."""
+    pending = {asyncio.ensure_future(c) for c in coros}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and task.result():
+                    return task.result()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _discover_on_host(session: aiohttp.ClientSession, host: str) -> Optional[str]:
+    # 1) Homepage scrape
+    html_text = await _memoized(session, ("page", host),
+                                lambda: _fetch_text(session, host))
+    for cand in await _extract_feed_urls(html_text, host) if html_text else []:
+        if await _probe_candidate(session, cand):
+            logger.debug("Feed via homepage %s → %s", host, cand)
+            return cand
+
+    # 2) Common paths & their inner pages, raced against each other (the
+    #    session's connector keeps this to PER_HOST_LIMIT requests per host)
+    return await _race_first(
+        _probe_path(session, host.rstrip("/") + "/" + suf.lstrip("/"))
+        for suf in COMMON_FEED_PATHS
+    )
+
 async def discover_feed(session: aiohttp.ClientSession, root: str) -> Optional[str]:
     """Return first valid feed URL discovered for *root*, else *None*."""
-    for host in await _alt_hosts(root):
-        # 1) Homepage scrape
-        try:
-            html_text = await _fetch_text(session, host)
-            for cand in await _extract_feed_urls(html_text, host):
-                if await _probe_candidate(session, cand):
-                    logger.debug("Feed via homepage %s → %s", host, cand)
-                    return html.unescape(cand)
-        except Exception:
-            pass
-
-        # 2) Common paths & their inner pages
-        for suf in COMMON_FEED_PATHS:
-            probe = host.rstrip("/") + "/" + suf.lstrip("/")
-            if await _probe_candidate(session, probe):
-                logger.debug("Feed via path %s", probe)
-                return probe
-            try:
-                probe_html = await _fetch_text(session, probe)
-                for cand in await _extract_feed_urls(probe_html, probe):
-                    if await _probe_candidate(session, cand):
-                        logger.debug("Feed inside %s → %s", probe, cand)
-                        return html.unescape(cand)
-            except Exception:
-                continue
-    return None
+    return await _race_first(
+        _discover_on_host(session, host) for host in await _alt_hosts(root)
+    )
 
 # ---------------------------------------------------------------------------
 # YAML I/O
 # ---------------------------------------------------------------------------
 
 def load_feed_dict() -> List[Dict[str, Any]]:
-    return yaml.safe_load(FEEDS_YAML.read_text(encoding="utf-8")) or []
+    return yaml.load(FEEDS_YAML.read_text(encoding="utf-8"), Loader=_YamlLoader) or []
 
 def save_feed_dict(data: Iterable[Dict[str, Any]]) -> None:
     FEEDS_YAML.write_text(
-        yaml.safe_dump(list(data), allow_unicode=True, sort_keys=False), encoding="utf-8"
+        yaml.dump(list(data), Dumper=_YamlDumper, allow_unicode=True, sort_keys=False),
+        encoding="utf-8",
     )
+
+def load_http_cache() -> Validators:
+    """Validators saved by the previous run (empty if none)."""
+    try:
+        data = json.loads(HTTP_CACHE_JSON.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {url: tuple(v) for url, v in data.items()}
+
+def save_http_cache(validators: Validators) -> None:
+    HTTP_CACHE_JSON.write_text(json.dumps(validators, indent=0), encoding="utf-8")
@@ -1,35 +1,118 @@
-import asyncio, hashlib, sqlite3, yaml, feedparser, aiohttp, re, html
+import asyncio, hashlib, sqlite3, feedparser, re, io
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from bs4 import BeautifulSoup
+from email.utils import parsedate_to_datetime
+from selectolax.lexbor import LexborHTMLParser
+from feeds.health import fetch_raw, load_feed_dict, make_session, run_loop
+from dateutil import parser as du
+from dateutil.tz import tzoffset
 from pathlib import Path
 import argparse, sys
 
 DB_PATH    = Path("news.db")
-FEEDS_YAML = Path("feeds.yaml")
 SCHEMA_SQL = Path("schema.sql")
 CONCURRENCY = 10
+PARSE_WORKERS = 4   # threads for feed parsing (see process_feed)
+
+# feed_rows reduces titles & summaries to plain text itself, so feedparser
+# needn't sanitise them or rewrite relative links inside them first
+FEEDPARSER_OPTS = {"resolve_relative_uris": False, "sanitize_html": False}
+
+_WS_RE  = re.compile(r"\s+")
+_TAG_RE = re.compile(r"<[^>]+>")
+_XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+_POSIX_TZ_RE = re.compile(r"(?:GMT|UTC)\s*[+-]\d")
+_ZONE_NAME_RE = re.compile(r"\b([A-Z]{2,5})\s*$")
+
+# Abbreviations dateutil can't resolve on its own (Spanish & US feeds). Each
+# label is a fixed offset: CET means +1 even in July, whatever Madrid observes
+TZINFOS = {
+    name: tzoffset(name, hours * 3600)
+    for name, hours in {
+        "WET": 0,  "WEST": 1, "CET": 1,  "CEST": 2,
+        "EST": -5, "EDT": -4, "CST": -6, "CDT": -5,
+        "MST": -7, "MDT": -6, "PST": -8, "PDT": -7,
+    }.items()
+}
+# Names dateutil maps to UTC itself
+_UTC_NAMES = {"UT", "UTC", "GMT"}
 
 def ensure_db():
-    """Create DB & schema if first run."""
-    if not DB_PATH.exists():
-        conn = sqlite3.connect(DB_PATH)
+    """Create DB & schema if first run; return a connection tuned for bulk writes."""
+    first_run = not DB_PATH.exists()
+    conn = sqlite3.connect(DB_PATH)
+    if first_run:
         conn.executescript(SCHEMA_SQL.read_text(encoding="utf-8"))
-        conn.close()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # v1: url_hash moved from MD5 to BLAKE2b – re-key stored articles so
+        # they aren't ingested again (titles were cut at 250 chars, so very
+        # long ones may still come back once)
+        with conn:
+            stored = conn.execute("SELECT title, url FROM articles").fetchall()
+            conn.executemany("INSERT OR IGNORE INTO article_hashes(url_hash) VALUES (?)",
+                             [(url_hash(plain_text(t), u),) for t, u in stored])
+            conn.execute("PRAGMA user_version = 1")
+    if version < 2:
+        # v2: HTTP validators for conditional feed downloads
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS feed_cache (
+                              url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT)""")
+            conn.execute("PRAGMA user_version = 2")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+def url_hash(title, link):
+    """Dedup key for an article: 128-bit BLAKE2b of title + link."""
+    return hashlib.blake2b((title + link).encode(), digest_size=16).hexdigest()
+
+def store_articles(db, rows):
+    """Insert *rows* in a single transaction; return how many were new.
+
+    Rows are ``(url_hash, title, summary, url, source, published_iso)``.
+    Hashes already stored, or repeated within *rows*, are skipped.
+    """
+    with db:
+        db.execute("""CREATE TEMP TABLE IF NOT EXISTS staging(
+                        url_hash, title, summary, url, source, published_iso)""")
+        db.execute("DELETE FROM staging")
+        db.executemany("INSERT INTO staging VALUES(?,?,?,?,?,?)", rows)
+        cur = db.execute("""INSERT INTO articles(title,summary,url,source,published_iso)
+                            SELECT title,summary,url,source,published_iso FROM staging
+                            WHERE rowid IN (SELECT min(rowid) FROM staging GROUP BY url_hash)
+                              AND url_hash NOT IN (SELECT url_hash FROM article_hashes)
+                            ORDER BY rowid""")
+        db.execute("INSERT OR IGNORE INTO article_hashes(url_hash) SELECT url_hash FROM staging")
+        return cur.rowcount
+
+def _html_to_text(markup):
+    tree = LexborHTMLParser(markup)
+    tree.strip_tags(["script", "style"])
+    return tree.text(separator=" ")
+
+def plain_text(raw):
+    """Return *raw* HTML as one line of text (entities decoded, tags dropped)."""
+    # strip tags & images and decode entities (&amp; → &, &#39; → ') in one
+    # lexbor pass; with neither markup nor entities there is nothing to parse
+    if "<" not in raw and "&" not in raw:
+        text = raw
+    else:
+        text = _html_to_text(raw)
+        # double-escaped feeds (&amp;lt;p&amp;gt;) only surface tags now
+        if _TAG_RE.search(text):
+            text = _html_to_text(text)
+    # collapse multiple spaces / newlines
+    return _WS_RE.sub(" ", text).strip()
 
 def clean_summary(entry, char_limit=500):
     """Return a plain-text summary ≤ char_limit, stripped of HTML/whitespace."""
     # 1. choose best raw HTML snippet
     raw = entry.get("summary") or \
           (entry.get("content") and entry.content[0].value) or ""
-    # 2. decode HTML entities (&amp; → &, &#39; → ')
-    raw = html.unescape(raw)
-    # 3. strip tags & images
-    # Use the built in HTML parser to avoid requiring the external ``lxml``
-    # dependency. ``lxml`` is not listed in ``requirements.txt`` and using it
-    # would cause runtime errors on a fresh install.
-    text = BeautifulSoup(raw, "html.parser").get_text(separator=" ", strip=True)
-    # 4. collapse multiple spaces / newlines
-    text = re.sub(r"\s+", " ", text).strip()
+    # 2-4. strip tags, decode entities, collapse whitespace
+    text = plain_text(raw)
     if not text:
         return ""
     # 5. soft-trim: keep whole sentence if it fits char_limit
@@ -38,56 +121,149 @@ def clean_summary(entry, char_limit=500):
         text = (text[: cut + 1] if cut != -1 else text[:char_limit].rstrip()) + "…"
     return text
 
-async def fetch(session, url, timeout=15):
-    async with session.get(url, timeout=timeout) as r:
-        return await r.read()
+def _parse_stamp(stamp):
+    """Aware datetime for *stamp*, or None if it can't be read reliably."""
+    # dateutil reads POSIX-style "GMT+0200" with the sign flipped
+    if _POSIX_TZ_RE.search(stamp):
+        return None
+    try:
+        dt = parsedate_to_datetime(stamp)  # RFC 822, what RSS mandates
+    except (TypeError, ValueError):
+        dt = None
+    if dt is None or dt.tzinfo is None:  # ISO 8601, or a zone name like CEST
+        # an unknown name (BST…) would silently come back as naive UTC
+        zone = _ZONE_NAME_RE.search(stamp)
+        if zone and zone.group(1) not in TZINFOS and zone.group(1) not in _UTC_NAMES:
+            return None
+        try:
+            dt = du.parse(stamp, tzinfos=TZINFOS)
+        except (ValueError, OverflowError):
+            return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def published_iso(entry):
+    """Return the entry's publication time as a UTC ISO string, or None."""
+    stamp = entry.get("published") or entry.get("updated")
+    dt = _parse_stamp(stamp) if stamp else None
+    if dt:
+        return dt.astimezone(timezone.utc).isoformat()
+    # unreadable (localised month names…) or ambiguous – use feedparser's guess
+    ts = entry.get("published_parsed") or entry.get("updated_parsed")
+    return datetime(*ts[:6], tzinfo=timezone.utc).isoformat() if ts else None
 
-async def process_feed(session, db, feed_def, max_items):
-    raw = await fetch(session, feed_def["url"])
-    parsed = feedparser.parse(raw)
-    source = feed_def.get("source") or parsed.feed.get("link", "?")
+def load_validators(db):
+    """``{url: (etag, last_modified)}`` stored by the previous run."""
+    return {url: (etag, modified) for url, etag, modified
+            in db.execute("SELECT url, etag, last_modified FROM feed_cache")}
 
-    for entry in parsed.entries[:max_items]:
-        ts = entry.get("published_parsed") or entry.get("updated_parsed")
-        if not ts:
+def save_validators(db, validators):
+    with db:
+        db.execute("DELETE FROM feed_cache")
+        db.executemany("INSERT INTO feed_cache VALUES(?,?,?)",
+                       [(url, etag, modified) for url, (etag, modified) in validators.items()])
+
+async def fetch(session, url, validators=None):
+    """Return the body as a seekable stream for ``feedparser.parse``.
+
+    ``None`` when *validators* made the request conditional and the feed
+    answered 304 Not Modified.
+    """
+    raw = await fetch_raw(session, url, validators)
+    return None if raw is None else io.BytesIO(raw)
+
+def parse_entries(stream, max_items):
+    """Return ``(feed_link, entries)`` holding at most *max_items* entries.
+
+    feedparser always parses a whole document, so long feeds are first cut
+    down with ``iterparse``: once *max_items* ``<item>``/``<entry>``
+    elements are in, later siblings are dropped and the channel/feed with
+    those entries is serialised once for feedparser, leaving the tail
+    unparsed. Feeds that end sooner are parsed from the original stream,
+    as are XML that expat rejects (undeclared entities, HTML served as
+    RSS…) and documents using ``xml:base``, whose relative links need the
+    original tree.
+    """
+    path, seen = [], 0
+    try:
+        for event, el in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if _XML_BASE in el.attrib:
+                    break
+                path.append(el)
+                continue
+            path.pop()
+            if el.tag.rsplit("}", 1)[-1] not in ("item", "entry") or not path:
+                continue
+            seen += 1
+            if seen < max_items:
+                continue
+            # iterparse reads ahead, so the parent may hold later siblings
+            parent = path[-1]
+            for later in list(parent)[list(parent).index(el) + 1:]:
+                parent.remove(later)
+            stream = io.BytesIO(ET.tostring(path[0]))
+            break
+    except ET.ParseError:
+        pass
+    stream.seek(0)
+    parsed = feedparser.parse(stream, **FEEDPARSER_OPTS)
+    return parsed.feed.get("link"), parsed.entries[:max_items]
+
+async def process_feed(session, feed_def, max_items, validators=None):
+    """Return article rows for *feed_def* (see :func:`store_articles`)."""
+    raw = await fetch(session, feed_def["url"], validators)
+    if raw is None:
+        return []  # unchanged since the last run
+    # parsing & HTML stripping are CPU-bound: keep them off the event loop so
+    # the other workers' downloads carry on meanwhile
+    return await asyncio.to_thread(feed_rows, raw, feed_def, max_items)
+
+def feed_rows(raw, feed_def, max_items):
+    """Parse the *raw* feed stream into article rows (runs in a worker thread)."""
+    feed_link, entries = parse_entries(raw, max_items)
+    source = feed_def.get("source") or feed_link or "?"
+
+    rows = []
+    for entry in entries:
+        published = published_iso(entry)
+        if not published:
             continue
+        # feedparser no longer sanitises titles (FEEDPARSER_OPTS): strip them too
+        title = plain_text(entry.title)
         summary = clean_summary(entry)
-        published = datetime(*ts[:6], tzinfo=timezone.utc).isoformat()
-        url_hash = hashlib.md5((entry.title + entry.link).encode()).hexdigest()
-        try:
-            db.execute("INSERT INTO article_hashes(url_hash) VALUES (?)", (url_hash,))
-            db.execute("""INSERT INTO articles(rowid,title,summary,url,
-                                            source,published_iso)
-                        VALUES(NULL,?,?,?,?,?)""",
-                    (entry.title[:250],
-                        summary,
-                        entry.link, source, published))
-        except sqlite3.IntegrityError:
-            pass  # duplicate
-
+        rows.append((url_hash(title, entry.link), title[:250], summary,
+                     entry.link, source, published))
+    return rows
 
 async def ingest(max_items):
-    ensure_db()
-    feeds = yaml.safe_load(FEEDS_YAML.read_text(encoding="utf-8"))
-    db = sqlite3.connect(DB_PATH)
+    db = ensure_db()
+    feeds = load_feed_dict()
+    validators = load_validators(db)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(PARSE_WORKERS))
     sem = asyncio.Semaphore(CONCURRENCY)
-    async with aiohttp.ClientSession() as session:
+    async with make_session(CONCURRENCY) as session:
         tasks = [
-            worker(session, db, f, max_items, sem)
+            worker(session, f, max_items, sem, validators)
             for f in feeds
         ]
-        await asyncio.gather(*tasks)
-    db.commit()
+        results = await asyncio.gather(*tasks)
+    store_articles(db, [row for rows in results for row in rows])
+    # only once the articles are stored, or a 304 next run would lose them
+    save_validators(db, validators)
+    db.close()
 
-async def worker(session, db, feed_def, max_items, sem):
+async def worker(session, feed_def, max_items, sem, validators):
     async with sem:
         try:
-            await process_feed(session, db, feed_def, max_items)
+            return await process_feed(session, feed_def, max_items, validators)
         except Exception as e:
+            # forget the validators so the next run downloads it in full
+            validators.pop(feed_def["url"], None)
             print("⚠️ Error:", feed_def['url'], '→', e, file=sys.stderr)
+            return []
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--max-per-feed", type=int, default=50)
     args = parser.parse_args()
-    asyncio.run(ingest(args.max_per_feed))
+    run_loop(ingest(args.max_per_feed))
@@ -1,5 +1,6 @@
 PRAGMA foreign_keys = ON;
 PRAGMA journal_mode = WAL;
+PRAGMA user_version = 2;
 
 CREATE VIRTUAL TABLE IF NOT EXISTS articles USING fts5(
   title,
@@ -12,3 +13,9 @@ CREATE VIRTUAL TABLE IF NOT EXISTS articles USING fts5(
 CREATE TABLE IF NOT EXISTS article_hashes (
   url_hash TEXT PRIMARY KEY
 );
+
+CREATE TABLE IF NOT EXISTS feed_cache (
+  url           TEXT PRIMARY KEY,
+  etag          TEXT,
+  last_modified TEXT
+);
@@ -3,8 +3,10 @@
 Quick validator: exits 1 if any feed is unreachable or unparsable.
 Run manually, as a pre-commit hook, or in CI.
 """
-import asyncio, logging, sys, aiohttp
-from feeds.health import load_feed_dict, validate_url
+import asyncio, logging, sys
+from feeds.health import (
+    load_feed_dict, load_http_cache, make_session, run_loop, save_http_cache, validate_url,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -13,17 +15,19 @@ CONCURRENCY = 12        # Tune for local v. CI speed
 async def main() -> None:
     feeds = load_feed_dict()
     bad   = []
+    cache = load_http_cache()   # unchanged feeds answer 304, skip re-parsing
 
     sem   = asyncio.Semaphore(CONCURRENCY)
-    async with aiohttp.ClientSession() as sess:
+    async with make_session(CONCURRENCY) as sess:
 
         async def check(f):
             async with sem:
-                ok = await validate_url(f["url"], sess)
+                ok = await validate_url(f["url"], sess, validators=cache)
                 if not ok:
                     bad.append(f)
 
         await asyncio.gather(*(check(f) for f in feeds))
+    save_http_cache(cache)
 
     # ---------- report ----------
     if bad:
@@ -35,4 +39,4 @@ async def main() -> None:
     logging.info("All %d feeds are healthy ✅", len(feeds))
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_loop(main())
@@ -14,10 +14,12 @@ python -m scripts.fix_feeds --debug
 python -m scripts.fix_feeds --apply
 """
 from __future__ import annotations
-import asyncio, argparse, logging, aiohttp
+import asyncio, argparse, logging
 from urllib.parse import urlparse
 from feeds.health import (
     load_feed_dict,
+    make_session,
+    run_loop,
     save_feed_dict,
     validate_url,
     discover_feed,
@@ -37,21 +39,24 @@ async def propose_fixes(feeds: list[dict]) -> tuple[dict[str, str], int]:
     broken_total = 0
     sem = asyncio.Semaphore(CONCURRENCY)
 
-    async with aiohttp.ClientSession() as sess:
+    # String work up front, so tasks only await the network
+    urls  = [f["url"] for f in feeds]
+    roots = [f"{urlparse(u).scheme}://{f['source']}" for u, f in zip(urls, feeds)]
 
-        async def handle(feed: dict):
+    async with make_session(CONCURRENCY) as sess:
+
+        async def handle(i: int):
             nonlocal broken_total
             async with sem:
-                ok = await validate_url(feed["url"], sess, strict=STRICT_CHECK)
+                ok = await validate_url(urls[i], sess, strict=STRICT_CHECK)
                 if ok:
                     return
                 broken_total += 1
-                root = f"{urlparse(feed['url']).scheme}://{feed['source']}"
-                alt  = await discover_feed(sess, root)
+                alt = await discover_feed(sess, roots[i])
                 if alt and await validate_url(alt, sess, strict=STRICT_CHECK):
-                    fixes[feed["url"]] = alt
+                    fixes[urls[i]] = alt
 
-        await asyncio.gather(*(handle(f) for f in feeds))
+        await asyncio.gather(*(handle(i) for i in range(len(feeds))))
 
     return fixes, broken_total
 
@@ -91,4 +96,4 @@ if __name__ == "__main__":
     p.add_argument("--apply", action="store_true", help="overwrite feeds.yaml")
     p.add_argument("--debug", action="store_true", help="verbose logging")
     args = p.parse_args()
-    asyncio.run(main(apply=args.apply, debug=args.debug))
+    run_loop(main(apply=args.apply, debug=args.debug))
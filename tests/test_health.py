@@ -0,0 +1,210 @@
+import asyncio, gc
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from feeds import health
+from feeds.health import (
+    _extract_feed_urls, _memoized, _race_first, discover_feed, fetch_raw,
+    make_session, validate_url,
+)
+
+
+def test_extract_feed_urls_prefers_alternate_links_and_dedupes():
+    page = (
+        "<html><head>"
+        "<link rel='alternate' type='application/rss+xml' href='/s/main'>"
+        "<link rel='stylesheet' href='/style.css'>"
+        "</head><body>"
+        "<a href='/rss/portada.xml'>RSS</a><a HREF=\"/feed\">Feed</a>"
+        "<a href='/rss/portada.xml'>again</a><img src='logo.png'>"
+        "<a href='/rss.php?sec=portada&amp;lang=es'>ES</a>"
+        "</body></html>"
+    )
+    urls = asyncio.run(_extract_feed_urls(page, "https://example.es/"))
+    assert urls == [
+        "https://example.es/s/main",
+        "https://example.es/rss/portada.xml",
+        "https://example.es/feed",
+        "https://example.es/rss.php?sec=portada&lang=es",
+    ]
+
+
+def test_fetch_raw_retries_after_503():
+    hits = []
+
+    async def handler(request):
+        hits.append(request.path)
+        if len(hits) == 1:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(body=b"<rss/>")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/rss", handler)
+        async with TestServer(app) as server, make_session(1) as sess:
+            return await fetch_raw(sess, str(server.make_url("/rss")))
+
+    assert asyncio.run(run()) == b"<rss/>"
+    assert len(hits) == 2
+
+
+RSS = b"""<?xml version="1.0"?><rss version="2.0"><channel><title>T</title>
+<item><title>Uno</title><link>https://example.es/1</link></item></channel></rss>"""
+
+
+def test_discover_feed_finds_common_path():
+    hits = []
+
+    async def feed(request):
+        hits.append(request.path)
+        return web.Response(body=RSS, content_type="application/rss+xml")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/rss.xml", feed)
+        async with TestServer(app) as server, make_session(4) as sess:
+            root = str(server.make_url("/")).rstrip("/")
+            found = await discover_feed(sess, root)
+            # fix_feeds re-validates the hit; the probe already did that
+            assert await validate_url(found, sess, strict=False)
+            return root, found
+
+    root, found = asyncio.run(run())
+    assert found == root + "/rss.xml"
+    assert hits == ["/rss.xml"]
+
+
+def test_race_first_returns_first_hit_and_cancels_rest():
+    slow_cancelled = asyncio.Event()
+
+    async def value(v, delay):
+        await asyncio.sleep(delay)
+        return v
+
+    async def boom():
+        raise RuntimeError
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            slow_cancelled.set()
+            raise
+
+    async def run():
+        won = await _race_first([value(None, 0), boom(), value("b", 0.01), slow()])
+        await asyncio.sleep(0)
+        return won
+
+    assert asyncio.run(run()) == "b"
+    assert slow_cancelled.is_set()
+
+
+def test_validate_url_is_memoised_per_session():
+    hits = []
+
+    async def feed(request):
+        hits.append(request.path)
+        return web.Response(body=RSS, content_type="application/rss+xml")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/rss.xml", feed)
+        async with TestServer(app) as server:
+            url = str(server.make_url("/rss.xml"))
+            async with make_session(4) as sess:
+                first = await asyncio.gather(*(validate_url(url, sess) for _ in range(3)))
+            async with make_session(4) as sess:
+                second = await validate_url(url, sess)
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [True, True, True] and second is True
+    assert len(hits) == 2
+
+
+def test_fetch_raw_conditional_get_returns_none_on_304():
+    async def feed(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=RSS, headers={"ETag": '"v1"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/rss.xml", feed)
+        validators = {}
+        async with TestServer(app) as server, make_session(1) as sess:
+            url = str(server.make_url("/rss.xml"))
+            first = await fetch_raw(sess, url, validators)
+            second = await fetch_raw(sess, url, validators)
+        return first, second, validators[url]
+
+    first, second, stored = asyncio.run(run())
+    assert first == RSS and second is None
+    assert stored == ('"v1"', None)
+
+
+def test_memo_does_not_outlive_sessions():
+    async def run():
+        app = web.Application()  # every path 404s, homepage included
+        async with TestServer(app) as server:
+            root = str(server.make_url("/")).rstrip("/")
+            for _ in range(3):
+                async with make_session(4) as sess:
+                    assert await discover_feed(sess, root) is None
+
+    asyncio.run(run())
+    gc.collect()
+    assert len(health._memo) == 0
+
+
+def test_validate_url_keeps_no_validators_after_a_failed_read():
+    async def truncated(request):
+        resp = web.StreamResponse(headers={"ETag": '"v1"'})
+        resp.content_length = 1000
+        await resp.prepare(request)
+        await resp.write(RSS[:20])
+        request.transport.close()  # body cut short mid-read
+        return resp
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/rss.xml", truncated)
+        async with TestServer(app) as server, make_session(1) as sess:
+            url = str(server.make_url("/rss.xml"))
+            validators = {url: ('"v0"', None)}  # from an earlier, valid run
+            ok = await validate_url(url, sess, validators=validators)
+        return ok, url in validators
+
+    assert asyncio.run(run()) == (False, False)
+
+
+def test_memoized_cancels_lookup_once_last_waiter_is_gone():
+    class Session:  # stands in for a ClientSession as the cache key
+        pass
+
+    started, cancelled = [], []
+
+    async def lookup():
+        started.append(1)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        sess = Session()
+        first = asyncio.ensure_future(_memoized(sess, ("k",), lookup))
+        second = asyncio.ensure_future(_memoized(sess, ("k",), lookup))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        still_running = not cancelled
+        second.cancel()
+        await asyncio.sleep(0.01)
+        return still_running, ("k",) in health._memo[sess]
+
+    still_running, cached = asyncio.run(run())
+    assert started == [1]
+    assert still_running and cancelled == [1]
+    assert not cached
@@ -1,5 +1,9 @@
-import re
-from ingest import clean_summary
+import hashlib, io, re, sqlite3
+import ingest
+from pathlib import Path
+from ingest import (
+    clean_summary, feed_rows, parse_entries, published_iso, store_articles, url_hash,
+)
 
 
 def test_clean_summary_strips_html_and_truncates():
@@ -15,3 +19,145 @@ def test_clean_summary_strips_html_and_truncates():
     assert len(result) <= 41
     if len(result) > 40:
         assert result.endswith("…")
+
+
+RSS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel>
+  <title>Portada</title><link>https://example.es/</link>
+  <item><title>Uno</title><link>https://example.es/1</link></item>
+  <item><title>Dos</title><link>https://example.es/2</link></item>
+  <item><title>Tres</title><link>https://example.es/3</link></item>
+</channel></rss>"""
+
+
+def test_parse_entries_stops_at_max_items():
+    feed_link, entries = parse_entries(io.BytesIO(RSS), max_items=2)
+    assert feed_link == "https://example.es/"
+    assert [e.title for e in entries] == ["Uno", "Dos"]
+
+
+def test_parse_entries_truncated_feed_keeps_namespaced_fields():
+    items = b"".join(
+        b"<item><title>T%d</title><link>https://example.es/%d</link>"
+        b"<content:encoded><![CDATA[<p>Full %d</p>]]></content:encoded></item>" % (i, i, i)
+        for i in range(5)
+    )
+    rss = (b'<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
+           b"<channel><link>https://example.es/</link>" + items + b"</channel></rss>")
+    feed_link, entries = parse_entries(io.BytesIO(rss), max_items=2)
+    assert feed_link == "https://example.es/"
+    assert [e.content[0].value for e in entries] == ["<p>Full 0</p>", "<p>Full 1</p>"]
+
+
+def test_parse_entries_falls_back_on_malformed_xml():
+    broken = RSS.replace(b"<title>Dos</title>", b"<title>Dos&nbsp;</title>")
+    feed_link, entries = parse_entries(io.BytesIO(broken), max_items=5)
+    assert feed_link == "https://example.es/"
+    assert len(entries) == 3
+
+
+def test_parse_entries_resolves_xml_base():
+    atom = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xml:base="https://a.es/">
+  <title>A</title><link href="/" rel="alternate"/>
+  <entry><title>Uno</title><link href="noticia/1"/></entry>
+</feed>"""
+    feed_link, entries = parse_entries(io.BytesIO(atom), max_items=5)
+    assert feed_link == "https://a.es/"
+    assert [e.link for e in entries] == ["https://a.es/noticia/1"]
+
+
+def test_published_iso_normalises_to_utc():
+    assert published_iso({"published": "Mon, 14 Oct 2024 10:00:00 +0200"}) == \
+        "2024-10-14T08:00:00+00:00"
+    assert published_iso({"updated": "Mon, 14 Oct 2024 10:00:00 CEST"}) == \
+        "2024-10-14T08:00:00+00:00"
+    assert published_iso({"published": "2024-10-14T10:00:00+02:00"}) == \
+        "2024-10-14T08:00:00+00:00"
+    assert published_iso({"published": "ayer"}) is None
+
+
+def test_published_iso_zone_names_are_fixed_offsets():
+    # the label decides the offset, not the season of the date
+    assert published_iso({"published": "Sun, 14 Jul 2024 10:00:00 CET"}) == \
+        "2024-07-14T09:00:00+00:00"
+    assert published_iso({"published": "Sun, 14 Jan 2024 10:00:00 CEST"}) == \
+        "2024-01-14T08:00:00+00:00"
+    assert published_iso({"published": "2024-07-14T10:00:00 EST"}) == \
+        "2024-07-14T15:00:00+00:00"
+
+
+def test_published_iso_unknown_zone_falls_back_to_feedparser():
+    entry = {
+        "published": "Sun, 14 Jul 2024 10:00:00 BST",
+        "published_parsed": (2024, 7, 14, 9, 0, 0, 6, 196, 0),
+    }
+    assert published_iso(entry) == "2024-07-14T09:00:00+00:00"
+
+
+def test_published_iso_leaves_posix_offsets_to_feedparser():
+    # dateutil would read GMT+0200 as two hours *behind* UTC
+    entry = {
+        "published": "Mon, 14 Oct 2024 10:00:00 GMT+0200",
+        "published_parsed": (2024, 10, 14, 8, 0, 0, 0, 288, 0),
+    }
+    assert published_iso(entry) == "2024-10-14T08:00:00+00:00"
+
+
+def test_store_articles_skips_duplicates():
+    db = sqlite3.connect(":memory:")
+    schema = Path(__file__).resolve().parents[1] / "schema.sql"
+    db.executescript(schema.read_text(encoding="utf-8"))
+    row = ("h1", "Uno", "", "https://example.es/1", "example.es", "2024-10-14T08:00:00+00:00")
+    other = ("h2",) + row[1:]
+    assert store_articles(db, [row, row, other]) == 2
+    assert store_articles(db, [row, other]) == 0
+    assert db.execute("SELECT count(*) FROM articles").fetchone() == (2,)
+
+
+def test_clean_summary_decodes_entities_without_unescape():
+    assert clean_summary({"summary": "Caf&eacute; &#39;y&#39; t&amp;e"}) == "Café 'y' t&e"
+    assert clean_summary({"summary": "&lt;p&gt;Hola &lt;b&gt;mundo&lt;/b&gt;&lt;/p&gt;"}) == "Hola mundo"
+    assert clean_summary({"summary": "Texto plano"}) == "Texto plano"
+
+
+def test_feed_rows_strips_markup_from_titles():
+    atom = b"""<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <title type="html">&lt;b&gt;Hola&lt;/b&gt; &lt;script&gt;alert(1)&lt;/script&gt;</title>
+    <link href="https://a.es/1"/><updated>2024-10-14T10:00:00Z</updated>
+  </entry>
+</feed>"""
+    (row,) = feed_rows(io.BytesIO(atom), {"source": "a.es"}, max_items=5)
+    assert row[1] == "Hola"
+    assert row[0] == url_hash("Hola", "https://a.es/1")
+
+
+# schema.sql as first released: MD5 keys, no user_version, no feed_cache
+V0_SCHEMA = """
+CREATE VIRTUAL TABLE articles USING fts5(
+  title, summary, url UNINDEXED, source UNINDEXED, published_iso UNINDEXED
+);
+CREATE TABLE article_hashes (url_hash TEXT PRIMARY KEY);
+"""
+
+
+def test_ensure_db_rekeys_v0_database(tmp_path, monkeypatch):
+    db_path = tmp_path / "news.db"
+    title, url = "<b>Hola</b>", "https://example.es/1"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(V0_SCHEMA)
+    conn.execute("INSERT INTO articles VALUES(?,?,?,?,?)",
+                 (title, "", url, "example.es", "2024-10-14T08:00:00+00:00"))
+    conn.execute("INSERT INTO article_hashes VALUES(?)",
+                 (hashlib.md5((title + url).encode()).hexdigest(),))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(ingest, "DB_PATH", db_path)
+    db = ingest.ensure_db()
+    assert db.execute("PRAGMA user_version").fetchone() == (2,)
+    hashes = {h for (h,) in db.execute("SELECT url_hash FROM article_hashes")}
+    assert url_hash("Hola", url) in hashes
+    assert db.execute("SELECT count(*) FROM feed_cache").fetchone() == (0,)
+    db.close()